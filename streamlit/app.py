@@ -1,21 +1,21 @@
 import os
-import uuid
+import secrets
+import asyncio
+import threading
+import time
+import logging
 import streamlit as st
-from typing import Generator, Dict, Any
-
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.prebuilt import create_react_agent 
-from langgraph.checkpoint.memory import MemorySaver
-
-from total_tools import (
-    tool_search_ipc_code_with_description, 
-    tool_search_ipc_description_from_code,
-    tool_search_detail_patent_by_id,
-    tool_search_patent_with_description
-)
+from collections import OrderedDict
+from typing import AsyncGenerator, Generator, Dict, Any
+
+# langchain_openai / langgraph / total_tools 등 무거운 모듈은
+# initialize_agent() 안에서 import (최초 1회만 로드되고 이후 rerun에서는 건너뜀)
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, trim_messages
+from langchain_core.tools import StructuredTool
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # 환경 변수 로드
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -266,29 +266,219 @@ SYSTEM_PROMPT = """
   사용자가 "몇 번"이라고 지칭했을 때 올바른 특허를 가리키도록 주의하십시오.
 """
 
+# 시스템 메시지는 스레드(체크포인트)에 저장하지 않고, LLM 호출 직전에 trim_history가 항상 앞에 붙임
+SYSTEM_MSG = SystemMessage(content=SYSTEM_PROMPT, id="system_persona")
+
+# LLM에 한 번에 보낼 대화 기록의 최대 토큰 수 (시스템 프롬프트 포함)
+# 이번 턴은 trim_history가 항상 통째로 보내므로, 이 예산은 사실상 이전 턴들의 분량만 제한함.
+# 대화가 길어져도 호출당 비용/지연이 늘지 않도록 작게 잡되,
+# "3번만 자세히" 같은 후속 질문을 위해 직전 검색 결과 한 번 분량은 남을 정도로 설정
+MAX_PROMPT_TOKENS = 32000
+
+# 도구 결과 캐시 설정 (같은 인자로 다시 호출되면 DB 검색 없이 바로 반환)
+TOOL_CACHE_TTL = 3600
+TOOL_CACHE_MAX_ENTRIES = 512
+
+# OpenAI API 연결 설정 (keep-alive 연결을 재사용해 매 호출마다 TLS 핸드셰이크를 하지 않도록)
+HTTP_TIMEOUT = 60
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_MAX_CONNECTIONS = 40
+
+# 대화 체크포인트 저장 위치 (실행 위치와 상관없이 이 파일 옆에 저장)
+CHECKPOINT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoints.db")
+
+# 체크포인트 보존 정책 (이어지는 대화에는 스레드별 최신 체크포인트만 필요)
+CHECKPOINTS_PER_THREAD = 5
+CHECKPOINT_RETENTION_DAYS = 7
+
+# 일괄 처리 시 동시에 실행할 최대 질문 수
+BATCH_MAX_CONCURRENCY = 10
+
+# 대화 첫 질문에 대한 답변 캐시 설정 (같은 질문이면 에이전트를 실행하지 않고 바로 답변)
+ANSWER_CACHE_TTL = 86400
+ANSWER_CACHE_MAX_ENTRIES = 1024
+
 # ==========================================
 # 1. 에이전트 초기화 
 # ==========================================
 
+def with_result_cache(base_tool: StructuredTool) -> StructuredTool:
+    """
+    도구 함수를 st.cache_data로 감싼 새 도구를 반환합니다.
+    이름/설명/입력 스키마는 그대로 유지되므로 LLM이 보는 도구 정의는 동일합니다.
+    비동기 실행 시에는 검색을 스레드로 넘겨, 한 턴의 여러 도구 호출이 동시에 진행됩니다.
+    """
+    cached_func = st.cache_data(
+        ttl=TOOL_CACHE_TTL,
+        max_entries=TOOL_CACHE_MAX_ENTRIES,
+        show_spinner=False,
+    )(base_tool.func)
+    
+    async def cached_coroutine(**kwargs):
+        # 벡터 DB/임베딩 검색은 동기 코드이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+        return await asyncio.to_thread(cached_func, **kwargs)
+    
+    return StructuredTool.from_function(
+        func=cached_func,
+        coroutine=cached_coroutine,
+        name=base_tool.name,
+        description=base_tool.description,
+        args_schema=base_tool.args_schema,
+    )
+
+async def open_checkpointer():
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    
+    conn = await aiosqlite.connect(CHECKPOINT_DB_PATH)
+    # WAL 모드: 읽기와 쓰기가 서로를 막지 않도록
+    await conn.execute("PRAGMA journal_mode=WAL")
+    
+    checkpointer = AsyncSqliteSaver(conn)
+    await checkpointer.setup()
+    
+    # 스레드별 마지막 사용 시각 (보존 기간이 지난 스레드 정리용)
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+    )
+    await conn.commit()
+    return checkpointer
+
+async def prune_checkpoints(checkpointer, thread_id: str):
+    """
+    체크포인트 DB가 끝없이 커지지 않도록 정리합니다.
+    - 방금 사용한 스레드는 최근 CHECKPOINTS_PER_THREAD개 체크포인트만 남기고,
+    - 마지막 사용 후 CHECKPOINT_RETENTION_DAYS일이 지난 스레드는 통째로 삭제합니다.
+    """
+    conn = checkpointer.conn
+    now = time.time()
+    cutoff = now - CHECKPOINT_RETENTION_DAYS * 86400
+    
+    async with checkpointer.lock:
+        await conn.execute(
+            "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+            (thread_id, now),
+        )
+        
+        for table in ("writes", "checkpoints"):
+            await conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, thread_id, CHECKPOINTS_PER_THREAD),
+            )
+            await conn.execute(
+                f"DELETE FROM {table} WHERE thread_id IN ("
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?)",
+                (cutoff,),
+            )
+        
+        await conn.execute("DELETE FROM thread_activity WHERE updated_at < ?", (cutoff,))
+        await conn.commit()
+
+async def prune_checkpoints_safely(checkpointer, thread_id: str):
+    # 체크포인트 정리는 부가 작업이므로, 실패해도(예: 여러 세션이 동시에 써서 database is locked)
+    # 이미 끝난 대화 턴을 실패로 만들지 않고 로그만 남김
+    try:
+        await prune_checkpoints(checkpointer, thread_id)
+    except Exception:
+        logger.warning("체크포인트 정리 실패 (thread_id=%s)", thread_id, exc_info=True)
+        # 중간까지 실행된 DELETE가 이후 체크포인터 쓰기와 함께 커밋되지 않도록 되돌림
+        try:
+            await checkpointer.conn.rollback()
+        except Exception:
+            pass
+
 @st.cache_resource
 def initialize_agent():
-    tools = [
+    import httpx
+    import tiktoken
+    from langchain_openai import ChatOpenAI
+    from langgraph.prebuilt import create_react_agent
+    
+    from total_tools import (
         tool_search_ipc_code_with_description, 
         tool_search_ipc_description_from_code,
         tool_search_detail_patent_by_id,
         tool_search_patent_with_description
+    )
+    
+    tools = [
+        with_result_cache(tool_search_ipc_code_with_description), 
+        with_result_cache(tool_search_ipc_description_from_code),
+        with_result_cache(tool_search_detail_patent_by_id),
+        with_result_cache(tool_search_patent_with_description)
     ]
-    llm = ChatOpenAI(model="gpt-4o", temperature=0, api_key=OPENAI_API_KEY)
-    memory = MemorySaver()
+    # 에이전트와 함께 캐시되므로 프로세스가 살아 있는 동안 같은 연결 풀을 계속 사용
+    limits = httpx.Limits(
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        max_connections=HTTP_MAX_CONNECTIONS,
+    )
+    llm = ChatOpenAI(
+        model="gpt-4o",
+        temperature=0,
+        api_key=OPENAI_API_KEY,
+        streaming=True,
+        http_client=httpx.Client(http2=True, timeout=HTTP_TIMEOUT, limits=limits),
+        http_async_client=httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=limits),
+    )
+    # 에이전트가 실행되는 공유 이벤트 루프 위에서 SQLite 연결을 연다
+    memory = asyncio.run_coroutine_threadsafe(open_checkpointer(), initialize_event_loop()).result()
+    
+    # 시스템 프롬프트는 바뀌지 않으므로 토큰 수도 에이전트 생성 시 한 번만 계산
+    system_tokens = len(tiktoken.encoding_for_model("gpt-4o").encode(SYSTEM_PROMPT))
+    
+    def trim_history(state):
+        # 체크포인터에는 전체 기록을 남기고, LLM에는 최근 기록만 잘라서 전달
+        # 시스템 프롬프트는 미리 계산한 system_tokens만큼 예산에서 빼고 다시 세지 않음
+        history = state["messages"]
+        
+        # 이번 턴(마지막 사용자 질문 + 이후 도구 호출/결과)은 크기와 상관없이 항상 그대로 전달하고,
+        # 남는 예산 안에서 이전 턴들만 잘라냄
+        last_human = max((i for i, m in enumerate(history) if m.type == "human"), default=0)
+        current_turn = history[last_human:]
+        budget = MAX_PROMPT_TOKENS - system_tokens - llm.get_num_tokens_from_messages(current_turn)
+        
+        earlier = []
+        if budget > 0:
+            earlier = trim_messages(
+                history[:last_human],
+                max_tokens=budget,
+                strategy="last",
+                token_counter=llm,
+                start_on="human",
+            )
+        return {"llm_input_messages": [SYSTEM_MSG, *earlier, *current_turn]}
     
     agent_executor = create_react_agent(
         model=llm,       
         tools=tools, 
-        checkpointer=memory
+        checkpointer=memory,
+        pre_model_hook=trim_history
     )
     
     return agent_executor
 
+@st.cache_resource
+def initialize_event_loop():
+    # 프로세스 전체에서 공유하는 이벤트 루프 (백그라운드 스레드에서 계속 실행)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def iterate_async(async_gen: AsyncGenerator) -> Generator:
+    """
+    비동기 제너레이터를 공유 이벤트 루프에서 실행하면서,
+    이벤트를 하나씩 꺼내 Streamlit 스크립트 스레드로 넘겨줍니다.
+    (UI 갱신은 스크립트 스레드에서만 해야 하므로 소비는 동기로 유지)
+    """
+    loop = initialize_event_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(async_gen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            break
+
 # ==========================================
 # 2. 세션 상태 초기화
 # ==========================================
@@ -298,79 +488,143 @@ def initialize_session_state():
         st.session_state.messages = []
     
     if "thread_id" not in st.session_state:
-        st.session_state.thread_id = str(uuid.uuid4())
+        st.session_state.thread_id = secrets.token_hex(8)
 
 # ==========================================
 # 3. 대화 기록 표시
 # ==========================================
 
+def render_tool_names(tool_names: list[str]):
+    with st.expander("사용한 도구", expanded=False):
+        for tool_name in tool_names:
+            st.markdown(f"- `{tool_name}`")
+
+def render_message(role: str, content: str, tool_names: list[str] | None = None):
+    # 문자열만 출력하므로 st.write의 타입 분기 없이 바로 markdown으로 렌더링
+    with st.chat_message(role):
+        st.markdown(content)
+        
+        if tool_names:
+            render_tool_names(tool_names)
+
 def display_chat_messages():
     for message in st.session_state.messages:
-        role = message["role"]
-        content = message["content"]
-        
-        if role == "user":
-            with st.chat_message("user"):
-                st.write(content)
-        elif role == "assistant":
-            with st.chat_message("assistant"):
-                st.write(content)
+        render_message(message["role"], message["content"], message.get("tool_names"))
 
 # ==========================================
 # 4. 에이전트 응답 스트리밍
 # ==========================================
 
-def stream_agent_response(agent_executor, user_input: str, thread_id: str) -> Generator:
+async def stream_agent_response(agent_executor, user_input: str, thread_id: str) -> AsyncGenerator:
     config = {"configurable": {"thread_id": thread_id}}
     
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT, id="system_persona"), 
-        HumanMessage(content=user_input)
-    ]
+    # 시스템 메시지는 trim_history가 붙여주므로 사용자 메시지만 전달
+    messages = [HumanMessage(content=user_input)]
     
     final_answer = ""
-    tool_calls_info = []
     
     try:
-        for event in agent_executor.stream({"messages": messages}, config=config):
-            for node_name, value in event.items():
-                if "messages" in value:
-                    last_message = value["messages"][-1]
-                    
-                    # 에이전트 노드
-                    if node_name == "agent":
-                        # 도구 호출
-                        if last_message.tool_calls:
-                            tool_name = last_message.tool_calls[0]['name']
-                            tool_calls_info.append({
-                                "role": "tool",
-                                "content": f"도구 실행: {tool_name}",
-                                "tool_name": tool_name
-                            })
-                            yield {"type": "tool_call", "tool_name": tool_name}
-                        
-                        # 최종 답변
-                        elif last_message.content:
-                            final_answer = last_message.content
-                            yield {"type": "answer", "content": final_answer}
-                    
-                    # 도구 노드
-                    elif node_name == "tools":
-                        content_length = len(str(last_message.content))
-                        yield {"type": "tool_result", "length": content_length}
+        async for event in agent_executor.astream_events({"messages": messages}, config=config, version="v2"):
+            kind = event["event"]
+            
+            # LLM 토큰 스트리밍
+            if kind == "on_chat_model_stream":
+                token = event["data"]["chunk"].content
+                if token:
+                    yield {"type": "token", "content": token}
+            
+            # LLM 호출 종료 (도구 호출 없이 끝났다면 최종 답변, 루프가 끝난 뒤 한 번만 전달)
+            elif kind == "on_chat_model_end":
+                output = event["data"]["output"]
+                if not getattr(output, "tool_calls", None) and output.content:
+                    final_answer = output.content
+            
+            # 도구 호출
+            elif kind == "on_tool_start":
+                yield {"type": "tool_call", "tool_name": event["name"]}
+            
+            # 도구 결과
+            elif kind == "on_tool_end":
+                output = event["data"].get("output")
+                content = getattr(output, "content", output)
+                # 문자열이면 그대로 길이만 재고, 큰 결과를 str()로 다시 복사하지 않음
+                if isinstance(content, str):
+                    content_length = len(content)
+                elif isinstance(content, list):
+                    content_length = sum(
+                        len(part.get("text", "")) if isinstance(part, dict) else len(str(part))
+                        for part in content
+                    )
+                else:
+                    content_length = len(str(content))
+                yield {"type": "tool_result", "length": content_length}
         
         # 최종 답변 반환
         if final_answer:
-            yield {"type": "final", "content": final_answer, "tool_calls": tool_calls_info}
+            yield {"type": "final", "content": final_answer}
     
     except Exception as e:
         yield {"type": "error", "message": str(e)}
+    
+    # 답변을 모두 전달한 뒤에 체크포인트 정리 (실패해도 턴에는 영향 없음)
+    await prune_checkpoints_safely(agent_executor.checkpointer, thread_id)
 
 # ==========================================
 # 5. 사용자 입력 처리
 # ==========================================
 
+@st.cache_resource
+def initialize_answer_cache() -> tuple[threading.Lock, OrderedDict]:
+    # 모든 세션이 공유하는 캐시: 정규화한 질문 -> (저장 시각, 답변)
+    # 여러 세션의 스크립트 스레드가 동시에 접근하므로 lock과 함께 보관
+    return threading.Lock(), OrderedDict()
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.split()).lower()
+
+def get_cached_answer(question: str) -> str | None:
+    lock, cache = initialize_answer_cache()
+    key = normalize_question(question)
+    
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        
+        saved_at, answer = entry
+        if time.monotonic() - saved_at > ANSWER_CACHE_TTL:
+            cache.pop(key, None)
+            return None
+        return answer
+
+def store_cached_answer(question: str, answer: str):
+    lock, cache = initialize_answer_cache()
+    key = normalize_question(question)
+    
+    with lock:
+        cache[key] = (time.monotonic(), answer)
+        # 기존 키를 갱신한 경우에도 가장 최근 항목으로 이동
+        cache.move_to_end(key)
+        
+        # 오래된 항목부터 제거
+        while len(cache) > ANSWER_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+async def record_cached_turn(agent_executor, thread_id: str, user_input: str, answer: str):
+    """
+    캐시에서 꺼낸 답변을 체크포인터에도 기록해, 이어지는 질문에서 대화 맥락이 유지되도록 합니다.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    messages = [HumanMessage(content=user_input), AIMessage(content=answer)]
+    await agent_executor.aupdate_state(config, {"messages": messages}, as_node="agent")
+
 def process_user_input(user_input: str, agent_executor):
+    # 대화의 첫 질문만 캐시 대상 (이후 질문은 앞선 대화 맥락에 따라 답이 달라짐)
+    cacheable = not st.session_state.messages
+    cached_answer = None
+    if cacheable and not st.session_state.get("fresh_answer", False):
+        cached_answer = get_cached_answer(user_input)
+    
     # 사용자 메시지 추가
     st.session_state.messages.append({
         "role": "user",
@@ -381,62 +635,145 @@ def process_user_input(user_input: str, agent_executor):
     with st.chat_message("user"):
         st.write(user_input)
     
+    # 캐시된 답변이 있으면 에이전트를 실행하지 않고 바로 표시
+    # (이번 턴에는 도구가 실행되지 않았으므로 사용한 도구 목록은 표시하지 않음)
+    if cached_answer is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(
+                record_cached_turn(agent_executor, st.session_state.thread_id, user_input, cached_answer),
+                initialize_event_loop(),
+            ).result()
+        except Exception as e:
+            with st.chat_message("assistant"):
+                st.error(f"오류가 발생했습니다: {str(e)}")
+            return
+        
+        render_message("assistant", cached_answer)
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": cached_answer
+        })
+        
+        # 체크포인트 정리는 기다리지 않고 공유 이벤트 루프에 맡김
+        asyncio.run_coroutine_threadsafe(
+            prune_checkpoints_safely(agent_executor.checkpointer, st.session_state.thread_id),
+            initialize_event_loop(),
+        )
+        return
+    
     # 에이전트 응답 생성
     with st.chat_message("assistant"):
-        response_placeholder = st.empty()
-        tool_placeholder = st.empty()
+        # 도구 상태와 답변을 하나의 placeholder에 함께 그려 갱신 메시지 수를 줄임
+        placeholder = st.empty()
         
         final_answer = ""
-        tool_calls = []
+        answer_buffer = ""
+        tool_status = ""
+        tool_names = []
         
         try:
             with st.spinner("생각 중..."):
-                for event in stream_agent_response(agent_executor, user_input, st.session_state.thread_id):
-                    event_type = event.get("type")
-                    
-                    if event_type == "tool_call":
-                        tool_name = event.get("tool_name")
-                        tool_placeholder.caption(f"{tool_name} 실행 중...")
-                        tool_calls.append({
-                            "role": "tool",
-                            "content": f"도구 실행: {tool_name}",
-                            "tool_name": tool_name
-                        })
-                    
-                    elif event_type == "tool_result":
-                        length = event.get("length")
-                        tool_placeholder.caption(f"데이터 수신 완료 ({length} 글자)")
-                    
-                    elif event_type == "answer":
-                        final_answer = event.get("content")
-                        response_placeholder.write(final_answer)
-                    
-                    elif event_type == "final":
-                        final_answer = event.get("content")
-                        response_placeholder.write(final_answer)
-                        tool_placeholder.empty()
-                    
-                    elif event_type == "error":
-                        error_msg = event.get("message")
-                        st.error(f"오류가 발생했습니다: {error_msg}")
-                        return
+                events = stream_agent_response(
+                    agent_executor,
+                    user_input,
+                    st.session_state.thread_id,
+                )
+                for event in iterate_async(events):
+                    match event.get("type"):
+                        case "token":
+                            answer_buffer += event.get("content")
+                            placeholder.markdown(f"{tool_status}\n\n{answer_buffer}")
+                        
+                        case "tool_call":
+                            # 도구 호출 전 단계에서 나온 중간 텍스트는 버림
+                            answer_buffer = ""
+                            tool_name = event.get("tool_name")
+                            tool_status = f":gray[`{tool_name}` 실행 중...]"
+                            placeholder.markdown(tool_status)
+                            tool_names.append(tool_name)
+                        
+                        case "tool_result":
+                            length = event.get("length")
+                            tool_status = f":gray[데이터 수신 완료 ({length} 글자)]"
+                            placeholder.markdown(tool_status)
+                        
+                        case "final":
+                            final_answer = event.get("content")
+                            placeholder.write(final_answer)
+                        
+                        case "error":
+                            error_msg = event.get("message")
+                            st.error(f"오류가 발생했습니다: {error_msg}")
+                            return
             
-            # 에이전트 응답을 세션 상태에 추가
+            # 에이전트 응답을 세션 상태에 추가 (도구 호출 정보는 답변 메시지에 함께 저장)
             if final_answer:
                 st.session_state.messages.append({
                     "role": "assistant",
-                    "content": final_answer
+                    "content": final_answer,
+                    "tool_names": tool_names
                 })
                 
-                # 도구 호출 정보 저장 
-                for tool_call in tool_calls:
-                    st.session_state.messages.append(tool_call)
+                if tool_names:
+                    render_tool_names(tool_names)
+                
+                if cacheable:
+                    store_cached_answer(user_input, final_answer)
         
         except Exception as e:
             st.error(f"오류가 발생했습니다: {str(e)}")
 
 # ==========================================
-# 6. 메인 UI
+# 6. 일괄 처리 (평가/대량 질의용)
+# ==========================================
+
+async def run_batch(
+    agent_executor, questions: list[str], thread_ids: list[str] | None = None
+) -> list[str | Exception]:
+    """
+    여러 질문을 agent_executor.abatch로 동시에 처리하고, 질문 순서대로 결과를 반환합니다.
+    thread_ids를 주지 않으면 질문마다 새 스레드를 만들어 서로의 대화 기록이 섞이지 않게 합니다.
+    
+    반환 리스트의 각 항목은 성공한 질문이면 최종 답변 문자열이고,
+    실패한 질문(도구 오류, rate limit, recursion limit 등)이면 그때 발생한 예외 객체입니다.
+    한 질문이 실패해도 나머지 질문의 답변은 그대로 반환됩니다.
+    """
+    if thread_ids is None:
+        thread_ids = [secrets.token_hex(8) for _ in questions]
+    
+    inputs = [
+        {"messages": [HumanMessage(content=question)]}
+        for question in questions
+    ]
+    configs = [
+        {"configurable": {"thread_id": thread_id}, "max_concurrency": BATCH_MAX_CONCURRENCY}
+        for thread_id in thread_ids
+    ]
+    
+    results = await agent_executor.abatch(inputs, config=configs, return_exceptions=True)
+    
+    # 성공/실패와 상관없이 모든 스레드의 체크포인트 정리
+    for thread_id in thread_ids:
+        await prune_checkpoints_safely(agent_executor.checkpointer, thread_id)
+    
+    return [
+        result if isinstance(result, Exception) else result["messages"][-1].content
+        for result in results
+    ]
+
+def process_user_inputs_batch(
+    inputs: list[str], thread_ids: list[str] | None = None
+) -> list[str | Exception]:
+    # UI 없이 동기 코드(평가 스크립트 등)에서 호출할 수 있도록 공유 이벤트 루프에서 실행
+    # 반환 형식은 run_batch와 동일 (실패한 질문 자리에는 예외 객체)
+    agent_executor = initialize_agent()
+    future = asyncio.run_coroutine_threadsafe(
+        run_batch(agent_executor, inputs, thread_ids), initialize_event_loop()
+    )
+    return future.result()
+
+# ==========================================
+# 7. 메인 UI
 # ==========================================
 
 def main():
@@ -459,10 +796,14 @@ def main():
     with st.sidebar:
         st.header("설정")
         
+        # 버튼 클릭 자체가 rerun을 일으키고, 이 분기는 대화 기록 표시보다 먼저 실행되므로
+        # 상태만 초기화하면 이번 실행에서 바로 빈 대화가 그려짐 (st.rerun() 불필요)
         if st.button("🔄 새 대화 시작", use_container_width=True):
             st.session_state.messages = []
-            st.session_state.thread_id = str(uuid.uuid4())
-            st.rerun()
+            st.session_state.thread_id = secrets.token_hex(8)
+        
+        # 켜면 캐시된 답변을 쓰지 않고 항상 에이전트를 새로 실행
+        st.toggle("새 답변 생성 (캐시 사용 안 함)", key="fresh_answer")
         
         st.divider()
         
@@ -477,7 +818,7 @@ def main():
         process_user_input(user_input, agent_executor)
 
 # ==========================================
-# 7. 실행
+# 8. 실행
 # ==========================================
 
 if __name__ == "__main__":